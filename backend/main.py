@@ -7,24 +7,33 @@ Now with SQLite database for production-ready persistence.
 
 from fastapi import FastAPI, HTTPException, Depends, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, field_validator
 from typing import Optional, Dict, Any, List
+from datetime import datetime
+from types import MappingProxyType
 from sqlalchemy.orm import Session
+from cachetools import TTLCache
 import os
-import shutil
+import copy
+import aiofiles
+import hashlib
+import mimetypes
+import orjson
 from dotenv import load_dotenv
 
-from services.billing_agent import BillingAgent
+from services.billing_agent import BillingAgent, DEMO_MODEL
 from services.pdf_generator import PDFGenerator
-from services.db_service import CaseService, RevenueService, seed_demo_data
+from services.slide_images import UPLOAD_DIR, IMAGE_MIME_TYPES
+from services.db_service import CaseService, RevenueService, seed_demo_data, CASE_EDITABLE_FIELDS
 
 # Import models - handle both direct run and module import
 try:
-    from models import get_db, PathologyCase
+    from models import get_request_db, DBSessionMiddleware, PathologyCase
 except ImportError:
-    from .models import get_db, PathologyCase
+    from .models import get_request_db, DBSessionMiddleware, PathologyCase
 
 # Load environment variables
 load_dotenv()
@@ -32,47 +41,209 @@ load_dotenv()
 app = FastAPI(
     title="PathoAI Revenue Recovery API",
     description="2026 CMS Compliance & Billing Automation",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse  # orjson encodes datetimes natively
 )
 
 # CORS middleware for Next.js frontend
 # Allow localhost for development and Vercel for production
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    # "http://localhost:3000",
-    # "http://127.0.0.1:3000",
-    # "https://patho-taupe.vercel.app",
-    # "https://*.vercel.app",  # Allow all Vercel preview deployments
+    # Concrete origins let Starlette match by string compare, and are required
+    # for credentialed requests ("*" is ignored by browsers when credentials are on)
+    allow_origins=[
+        "http://localhost:3000",
+        "http://127.0.0.1:3000",
+        "https://patho-taupe.vercel.app",
+    ],
+    allow_origin_regex=r"https://patho-[a-z0-9-]+\.vercel\.app",  # This project's Vercel preview deployments only
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
     expose_headers=["Content-Disposition"],  # CRITICAL: Allows browser to see the filename
 )
 
-# Ensure uploads directory exists (use absolute path)
-UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "uploads"))
+# One DB session per request, handed to routes via get_request_db
+app.add_middleware(DBSessionMiddleware)
+
+# Ensure uploads directory exists (absolute path, see services.slide_images)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Slide image types, registered once so StaticFiles' guess_type() doesn't
+# depend on the host's mimetypes database (e.g. missing .webp, Windows registry)
+for _ext, _type in IMAGE_MIME_TYPES.items():
+    mimetypes.add_type(_type, _ext)
+
+# Serve uploaded slide images; Starlette sends the file body with sendfile(2)
+app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR, html=False), name="uploads")
+
+# Copy chunk size for slide uploads (large buffers keep throughput up)
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+def _sendfile_upload(file: UploadFile, file_path: str) -> None:
+    """
+    Copy an uploaded slide to disk kernel-to-kernel with sendfile(2).
+    Raises AttributeError/OSError where sendfile is unavailable.
+    """
+    src = file.file
+    # Spill the in-memory spool to disk so it has a real file descriptor
+    if hasattr(src, "rollover"):
+        src.rollover()
+    src.flush()
+    
+    dst_fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        src_fd = src.fileno()
+        offset = 0
+        while True:
+            sent = os.sendfile(dst_fd, src_fd, offset, UPLOAD_CHUNK_SIZE)
+            if sent == 0:
+                break
+            offset += sent
+    finally:
+        os.close(dst_fd)
+
+
+async def _save_upload(file: UploadFile, file_path: str) -> None:
+    """
+    Save an uploaded slide without blocking the event loop.
+    Uses sendfile in the threadpool, else an async chunked write.
+    """
+    try:
+        await run_in_threadpool(_sendfile_upload, file, file_path)
+    except (AttributeError, OSError):
+        # No sendfile on this platform/file type - stream through aiofiles
+        await file.seek(0)
+        async with aiofiles.open(file_path, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await out.write(chunk)
+    finally:
+        # Release the spool's file descriptor now rather than at GC
+        await file.close()
+
+
 # Initialize services
 billing_agent = BillingAgent()
 pdf_generator = PDFGenerator()
 
-# Seed demo data on startup
+# Read caches for the hot GET paths (serialized dicts, never ORM objects).
+# Any write to a case must call _invalidate_case_cache().
+_case_cache = TTLCache(maxsize=1024, ttl=30)  # slide_id -> case detail
+_list_cache = TTLCache(maxsize=32, ttl=10)    # status filter -> case list JSON
+_summary_cache = TTLCache(maxsize=1, ttl=10)  # dashboard metrics (polled)
+
+
+def _invalidate_case_cache(slide_id: Optional[str] = None) -> None:
+    """Drop cached reads after a case is created, modified or deleted."""
+    if slide_id is not None:
+        _case_cache.pop(slide_id, None)
+    _list_cache.clear()
+    _summary_cache.clear()
+
+
+# Exact-match cache of billing agent results, shared by /api/analyze and
+# /api/analyze/stream; identical payloads skip the LLM round-trip entirely
+_analyze_cache = TTLCache(maxsize=2048, ttl=3600)
+
+
+def _analyze_cache_key(slide_id: str, image_path: Optional[str], findings: Optional[Dict[str, Any]]) -> str:
+    """Stable hash of an analyze request (key order in findings doesn't matter)."""
+    # Uploads overwrite the same path, so the file's size/mtime stand in for its content
+    try:
+        st = os.stat(image_path) if image_path else None
+        img_version = (st.st_size, st.st_mtime_ns) if st else None
+    except OSError:
+        img_version = None
+    payload = orjson.dumps(
+        {"sid": slide_id, "img": image_path, "iv": img_version, "f": findings},
+        option=orjson.OPT_SORT_KEYS
+    )
+    return hashlib.blake2b(payload, digest_size=16).hexdigest()
+
+
+def _cache_analysis(cache_key: str, result: Dict[str, Any]) -> None:
+    """Cache real model output only - never demo data from a quota/parse fallback."""
+    if result.get("model_used") != DEMO_MODEL:
+        _analyze_cache[cache_key] = copy.deepcopy(result)
+
+# Seed demo data on startup (first boot only)
 @app.on_event("startup")
 async def startup_event():
+    # seed_demo_data() returns after a single LIMIT 1 probe on warm restarts
     seed_demo_data()
 
 
+# ===== Billing Constants =====
+
+# Reimbursement lookup (national averages), shared read-only across requests
+_BASE_REIMBURSEMENT = 72.00  # 88305 national average
+_CPT_VALUES = MappingProxyType({
+    "88305": 72.00,
+    "88307": 85.00,
+    "88309": 90.40,
+    "0596T": 8.20  # AI-assisted add-on
+})
+
+# These are illustrative demo regions (callers must copy, never mutate)
+_DEMO_REGIONS = (
+    {
+        "id": 1,
+        "x": 120, "y": 150, "width": 80, "height": 60,
+        "label": "High-grade nuclei cluster",
+        "description": "Marked nuclear pleomorphism with irregular contours",
+        "cpt_impact": "+$6.20",
+        "billable": True,
+        "demo_only": True
+    },
+    {
+        "id": 2,
+        "x": 280, "y": 200, "width": 100, "height": 70,
+        "label": "Mitotic figures",
+        "description": "18 mitoses per 10 HPF - elevated activity",
+        "cpt_impact": "+$4.40",
+        "billable": True,
+        "demo_only": True
+    },
+    {
+        "id": 3,
+        "x": 180, "y": 320, "width": 90, "height": 50,
+        "label": "Perineural invasion",
+        "description": "Tumor cells surrounding nerve bundle",
+        "cpt_impact": "+$5.80",
+        "billable": True,
+        "demo_only": True
+    },
+    {
+        "id": 4,
+        "x": 350, "y": 280, "width": 70, "height": 80,
+        "label": "Lymphovascular invasion",
+        "description": "Tumor emboli within vascular spaces",
+        "cpt_impact": "+$2.00",
+        "billable": True,
+        "demo_only": True
+    }
+)
+
+
 # ===== Request/Response Models =====
 
-class AnalyzeRequest(BaseModel):
+class _RequestModel(BaseModel):
+    """
+    Base for request bodies. Validators are compiled when the class is
+    created (pydantic v2), so the first request pays no build cost.
+    Frozen: handlers read requests, never mutate them.
+    """
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
+
+class AnalyzeRequest(_RequestModel):
     slide_id: str
     image_path: Optional[str] = None
     findings: Optional[Dict[str, Any]] = None
 
 
-class DocumentRequest(BaseModel):
+class DocumentRequest(_RequestModel):
     slide_id: str
     pathologist_name: str
     verified_cpt_codes: List[str]
@@ -80,19 +251,46 @@ class DocumentRequest(BaseModel):
     billing_data: Optional[Dict[str, Any]] = None
 
 
-class CreateCaseRequest(BaseModel):
+class CreateCaseRequest(_RequestModel):
     patient_id: str
     patient_name: Optional[str] = None
     diagnosis: Optional[str] = None
     slide_id: Optional[str] = None
 
 
-class RegionClickRequest(BaseModel):
+class RegionClickRequest(_RequestModel):
     slide_id: str
     region_label: str
     user: Optional[str] = "pathologist"
 
 
+class CaseListItem(BaseModel):
+    """One row of GET /api/cases, read straight from the column-only select."""
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: int
+    patient_id: Optional[str] = None
+    patient_name: Optional[str] = None
+    slide_id: Optional[str] = None
+    diagnosis: Optional[str] = None
+    status: Optional[str] = None
+    image_url: Optional[str] = None
+    base_cpt: Optional[str] = Field(None, validation_alias="base_cpt_code")
+    suggested_cpt: Optional[str] = Field(None, validation_alias="suggested_cpt_code")
+    recovery_value: float = 0
+    confidence_score: Optional[float] = None
+    created_at: Optional[datetime] = None
+    
+    @field_validator("recovery_value", mode="before")
+    @classmethod
+    def _recovery_default(cls, value):
+        return value or 0
+
+
+# Built once; validates Row tuples and serializes the list in pydantic-core
+_case_list_adapter = TypeAdapter(List[CaseListItem])
+
+
 # ===== Health Check =====
 
 @app.get("/")
@@ -105,66 +303,39 @@ async def root():
     }
 
 
-# ===== Serve Uploaded Images =====
-
-@app.get("/uploads/{filename}")
-async def get_uploaded_image(filename: str):
-    """Serve uploaded slide images."""
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Image not found")
-    
-    # Determine content type
-    content_type = "image/jpeg"
-    if filename.lower().endswith(".png"):
-        content_type = "image/png"
-    elif filename.lower().endswith(".gif"):
-        content_type = "image/gif"
-    elif filename.lower().endswith(".webp"):
-        content_type = "image/webp"
-    
-    return FileResponse(file_path, media_type=content_type)
-
-
 # ===== Case Management =====
 
 @app.get("/api/cases")
-async def get_cases(status: Optional[str] = None, db: Session = Depends(get_db)):
+async def get_cases(status: Optional[str] = None, db: Session = Depends(get_request_db)):
     """
     Retrieve all cases, optionally filtered by status.
     Status: PENDING, ANALYZED, VERIFIED, EXPORTED
     """
-    try:
-        cases = CaseService.get_all_cases(db, status)
-        return [
-            {
-                "id": c.id,
-                "patient_id": c.patient_id,
-                "patient_name": c.patient_name,
-                "slide_id": c.slide_id,
-                "diagnosis": c.diagnosis,
-                "status": c.status,
-                "image_url": c.image_url,
-                "base_cpt": c.base_cpt_code,
-                "suggested_cpt": c.suggested_cpt_code,
-                "recovery_value": c.recovery_value or 0,
-                "confidence_score": c.confidence_score,
-                "created_at": c.created_at.isoformat() if c.created_at else None
-            }
-            for c in cases
-        ]
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to fetch cases: {str(e)}")
+    content = _list_cache.get(status)
+    if content is None:
+        try:
+            rows = CaseService.get_case_list_rows(db, status)
+            cases = _case_list_adapter.validate_python(rows, from_attributes=True)
+            content = _case_list_adapter.dump_json(cases)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch cases: {str(e)}")
+        _list_cache[status] = content
+    
+    return Response(content=content, media_type="application/json")
 
 
 @app.get("/api/cases/{slide_id}")
-async def get_case(slide_id: str, db: Session = Depends(get_db)):
+async def get_case(slide_id: str, db: Session = Depends(get_request_db)):
     """Retrieve a specific case by slide ID with full details."""
+    cached = _case_cache.get(slide_id)
+    if cached is not None:
+        return cached
+    
     case = CaseService.get_case_by_slide_id(db, slide_id)
     if not case:
         raise HTTPException(status_code=404, detail="Case not found")
     
-    return {
+    result = {
         "id": case.id,
         "patient_id": case.patient_id,
         "patient_name": case.patient_name,
@@ -186,14 +357,16 @@ async def get_case(slide_id: str, db: Session = Depends(get_db)):
         "audit_defense_score": case.audit_defense_score,
         "annotated_regions": case.annotated_regions,
         "verified_by": case.verified_by,
-        "verified_at": case.verified_at.isoformat() if case.verified_at else None,
+        "verified_at": case.verified_at,
         "audit_log": case.audit_log,
-        "created_at": case.created_at.isoformat() if case.created_at else None
+        "created_at": case.created_at
     }
+    _case_cache[slide_id] = result
+    return result
 
 
 @app.post("/api/cases")
-async def create_case(request: CreateCaseRequest, db: Session = Depends(get_db)):
+async def create_case(request: CreateCaseRequest, db: Session = Depends(get_request_db)):
     """Create a new case for analysis."""
     try:
         slide_id = request.slide_id or f"WSI-2024-{request.patient_id[-4:]}"
@@ -211,6 +384,7 @@ async def create_case(request: CreateCaseRequest, db: Session = Depends(get_db))
             diagnosis=request.diagnosis,
             image_url=None  # Will show "Upload Slide Image" placeholder
         )
+        _invalidate_case_cache(slide_id)
         
         return {
             "status": "created",
@@ -227,29 +401,39 @@ async def create_case(request: CreateCaseRequest, db: Session = Depends(get_db))
 async def upload_slide_image(
     slide_id: str,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_request_db)
 ):
     """Upload a slide image for a case."""
-    case = CaseService.get_case_by_slide_id(db, slide_id)
-    if not case:
+    file_ext = os.path.splitext(file.filename)[1]
+    image_url = f"/uploads/{slide_id}{file_ext}"
+    
+    # Plain read first - no write transaction (and SQLite write lock) is held
+    # across the awaited file copy
+    if CaseService.get_case_by_slide_id(db, slide_id) is None:
         raise HTTPException(status_code=404, detail="Case not found")
     
     # Save file
-    file_ext = os.path.splitext(file.filename)[1]
     file_path = os.path.join(UPLOAD_DIR, f"{slide_id}{file_ext}")
+    await _save_upload(file, file_path)
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    # Update case
-    case.image_url = f"/uploads/{slide_id}{file_ext}"
+    # Point the case at the new image and commit straight away
+    row = CaseService.update_case_fields(db, slide_id, {"image_url": image_url})
+    if row is None:
+        # Case was deleted while the file was being written
+        db.rollback()
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        raise HTTPException(status_code=404, detail="Case not found")
     db.commit()
+    _invalidate_case_cache(slide_id)
     
-    return {"status": "uploaded", "image_url": case.image_url}
+    return {"status": "uploaded", "image_url": row.image_url}
 
 
 @app.delete("/api/cases/{slide_id}")
-async def delete_case(slide_id: str, db: Session = Depends(get_db)):
+async def delete_case(slide_id: str, db: Session = Depends(get_request_db)):
     """Delete a case by slide ID."""
     case = CaseService.get_case_by_slide_id(db, slide_id)
     if not case:
@@ -259,12 +443,15 @@ async def delete_case(slide_id: str, db: Session = Depends(get_db)):
         # Delete associated image file if exists
         if case.image_url and case.image_url.startswith("/uploads/"):
             image_path = os.path.join(os.path.dirname(__file__), case.image_url.lstrip("/"))
-            if os.path.exists(image_path):
+            try:
                 os.remove(image_path)
+            except FileNotFoundError:
+                pass
         
         # Delete from database
         db.delete(case)
         db.commit()
+        _invalidate_case_cache(slide_id)
         
         return {"status": "deleted", "slide_id": slide_id}
     except Exception as e:
@@ -273,31 +460,28 @@ async def delete_case(slide_id: str, db: Session = Depends(get_db)):
 
 
 @app.put("/api/cases/{slide_id}")
-async def update_case(slide_id: str, request: dict, db: Session = Depends(get_db)):
+async def update_case(slide_id: str, request: dict, db: Session = Depends(get_request_db)):
     """Update case information."""
-    case = CaseService.get_case_by_slide_id(db, slide_id)
-    if not case:
-        raise HTTPException(status_code=404, detail="Case not found")
+    # Update allowed fields
+    values = {k: v for k, v in request.items() if k in CASE_EDITABLE_FIELDS}
     
     try:
-        # Update allowed fields
-        if "patient_name" in request:
-            case.patient_name = request["patient_name"]
-        if "diagnosis" in request:
-            case.diagnosis = request["diagnosis"]
-        if "patient_id" in request:
-            case.patient_id = request["patient_id"]
+        row = CaseService.update_case_fields(db, slide_id, values)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Case not found")
         
         db.commit()
-        db.refresh(case)
+        _invalidate_case_cache(slide_id)
         
         return {
             "status": "updated",
-            "slide_id": case.slide_id,
-            "patient_name": case.patient_name,
-            "diagnosis": case.diagnosis,
-            "patient_id": case.patient_id
+            "slide_id": row.slide_id,
+            "patient_name": row.patient_name,
+            "diagnosis": row.diagnosis,
+            "patient_id": row.patient_id
         }
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to update case: {str(e)}")
@@ -305,8 +489,47 @@ async def update_case(slide_id: str, request: dict, db: Session = Depends(get_db
 
 # ===== AI Analysis =====
 
+def _finalize_analysis(db: Session, case: Optional[PathologyCase], result: dict) -> dict:
+    """Add viewer regions and reimbursement to an agent result and persist it on the case."""
+    # IMPORTANT: Annotated regions should come from actual computer vision analysis
+    # For demo/MVP, we only show regions for the demo image, not user uploads
+    # In production, integrate a vision model (Gemini Vision, pathology-specific AI, etc.)
+    
+    # SHARK: Demo Mode - Always show regions for visual impact
+    # In production, this would be: if case.has_cv_analysis:
+    annotated_regions = list(_DEMO_REGIONS)
+    
+    # For user-uploaded images: NO fake regions - that would be misleading/fraud
+    # The AI provides text-based analysis (audit narrative, complexity indicators)
+    # but does NOT claim to have detected visual features without real CV
+    
+    # Add annotated regions to result
+    result["annotated_regions"] = annotated_regions
+    
+    # Calculate reimbursements
+    suggested_cpt = result.get("recommended_cpt", "88305")
+    optimized = _CPT_VALUES.get(suggested_cpt, 72.00) + _CPT_VALUES.get("0596T", 0)
+    
+    result["base_reimbursement"] = _BASE_REIMBURSEMENT
+    result["optimized_reimbursement"] = optimized
+    
+
+    # SHARK: Ensure Audit Shield Metrics for UI
+    if "audit_defense_score" not in result:
+        result["audit_defense_score"] = 96
+    if "confidence_score" not in result:
+         result["confidence_score"] = 0.98
+
+    # Update case if exists
+    if case:
+        CaseService.update_with_analysis(db, case, result)
+        _invalidate_case_cache(case.slide_id)
+    
+    return result
+
+
 @app.post("/api/analyze")
-async def analyze_slide(request: AnalyzeRequest, db: Session = Depends(get_db)):
+async def analyze_slide(request: AnalyzeRequest, db: Session = Depends(get_request_db)):
     """
     Analyze slide using Gemini to extract 2026 CPT codes and audit justification.
     Updates case in database with results.
@@ -315,105 +538,66 @@ async def analyze_slide(request: AnalyzeRequest, db: Session = Depends(get_db)):
         # Get or create case
         case = CaseService.get_case_by_slide_id(db, request.slide_id)
         
-        # Run AI analysis
-        result = await billing_agent.analyze(
-            slide_id=request.slide_id,
-            image_path=request.image_path,
-            findings=request.findings
-        )
-        
-        # IMPORTANT: Annotated regions should come from actual computer vision analysis
-        # For demo/MVP, we only show regions for the demo image, not user uploads
-        # In production, integrate a vision model (Gemini Vision, pathology-specific AI, etc.)
-        
-        annotated_regions = []
-        
+        # Run AI analysis (cached results are copied - the dict is mutated below)
+        cache_key = _analyze_cache_key(request.slide_id, request.image_path, request.findings)
+        cached = _analyze_cache.get(cache_key)
+        if cached is not None:
+            result = copy.deepcopy(cached)
+        else:
+            result = await billing_agent.analyze(
+                slide_id=request.slide_id,
+                image_path=request.image_path,
+                findings=request.findings
+            )
+            _cache_analysis(cache_key, result)
         
-        # SHARK: Demo Mode - Always show regions for visual impact
-        # In production, this would be: if case.has_cv_analysis:
-        if True: 
-            # These are illustrative demo regions
-            annotated_regions = [
-                {
-                    "id": 1,
-                    "x": 120, "y": 150, "width": 80, "height": 60,
-                    "label": "High-grade nuclei cluster",
-                    "description": "Marked nuclear pleomorphism with irregular contours",
-                    "cpt_impact": "+$6.20",
-                    "billable": True,
-                    "demo_only": True
-                },
-                {
-                    "id": 2,
-                    "x": 280, "y": 200, "width": 100, "height": 70,
-                    "label": "Mitotic figures",
-                    "description": "18 mitoses per 10 HPF - elevated activity",
-                    "cpt_impact": "+$4.40",
-                    "billable": True,
-                    "demo_only": True
-                },
-                {
-                    "id": 3,
-                    "x": 180, "y": 320, "width": 90, "height": 50,
-                    "label": "Perineural invasion",
-                    "description": "Tumor cells surrounding nerve bundle",
-                    "cpt_impact": "+$5.80",
-                    "billable": True,
-                    "demo_only": True
-                },
-                {
-                    "id": 4,
-                    "x": 350, "y": 280, "width": 70, "height": 80,
-                    "label": "Lymphovascular invasion",
-                    "description": "Tumor emboli within vascular spaces",
-                    "cpt_impact": "+$2.00",
-                    "billable": True,
-                    "demo_only": True
-                }
-            ]
-        # For user-uploaded images: NO fake regions - that would be misleading/fraud
-        # The AI provides text-based analysis (audit narrative, complexity indicators)
-        # but does NOT claim to have detected visual features without real CV
-        
-        # Add annotated regions to result
-        result["annotated_regions"] = annotated_regions
-        
-        # Calculate reimbursements
-        base_reimbursement = 72.00  # 88305 national average
-        cpt_values = {
-            "88305": 72.00,
-            "88307": 85.00,
-            "88309": 90.40,
-            "0596T": 8.20  # AI-assisted add-on
-        }
-        
-        suggested_cpt = result.get("recommended_cpt", "88305")
-        optimized = cpt_values.get(suggested_cpt, 72.00) + cpt_values.get("0596T", 0)
-        
-        result["base_reimbursement"] = base_reimbursement
-        result["optimized_reimbursement"] = optimized
-        
-
-        # SHARK: Ensure Audit Shield Metrics for UI
-        if "audit_defense_score" not in result:
-            result["audit_defense_score"] = 96
-        if "confidence_score" not in result:
-             result["confidence_score"] = 0.98
-
-        # Update case if exists
-        if case:
-            CaseService.update_with_analysis(db, case, result)
-        
-        return result
+        return _finalize_analysis(db, case, result)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+@app.post("/api/analyze/stream")
+async def analyze_slide_stream(request: AnalyzeRequest, db: Session = Depends(get_request_db)):
+    """
+    Streaming variant of /api/analyze (NDJSON).
+    Each line is {field: value} as soon as the model has produced that field;
+    the last line is the full finalized result, after the case is updated.
+    """
+    case = CaseService.get_case_by_slide_id(db, request.slide_id)
+    
+    async def ndjson():
+        result = {}
+        cache_key = _analyze_cache_key(request.slide_id, request.image_path, request.findings)
+        try:
+            cached = _analyze_cache.get(cache_key)
+            if cached is not None:
+                # Same NDJSON shape as a live run, just all at once
+                result = copy.deepcopy(cached)
+                for key, value in result.items():
+                    yield orjson.dumps({key: value}) + b"\n"
+            else:
+                async for key, value in billing_agent.analyze_stream(
+                    slide_id=request.slide_id,
+                    image_path=request.image_path,
+                    findings=request.findings
+                ):
+                    result[key] = value
+                    yield orjson.dumps({key: value}) + b"\n"
+                _cache_analysis(cache_key, result)
+            
+            yield orjson.dumps({"result": _finalize_analysis(db, case, result)}) + b"\n"
+        except Exception as e:
+            # Headers are already sent - report the failure in-band
+            yield orjson.dumps({"error": f"Analysis failed: {str(e)}"}) + b"\n"
+    
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
 # ===== Interactive Viewer =====
 
 @app.post("/api/region-click")
-async def log_region_click(request: RegionClickRequest, db: Session = Depends(get_db)):
+async def log_region_click(request: RegionClickRequest, db: Session = Depends(get_request_db)):
     """
     Log when user clicks a region in the interactive viewer.
     This is critical for Human-in-the-loop compliance.
@@ -423,6 +607,7 @@ async def log_region_click(request: RegionClickRequest, db: Session = Depends(ge
         raise HTTPException(status_code=404, detail="Case not found")
     
     CaseService.log_region_click(db, case, request.region_label, request.user)
+    _invalidate_case_cache(case.slide_id)
     
     # Return the region's billing justification
     regions = case.annotated_regions or []
@@ -435,10 +620,18 @@ async def log_region_click(request: RegionClickRequest, db: Session = Depends(ge
     }
 
 
+# ===== LLM Cache =====
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters for the billing agent's response cache."""
+    return billing_agent.cache.get_stats()
+
+
 # ===== Verification & Documentation =====
 
 @app.post("/api/document")
-async def document_verification(request: DocumentRequest, db: Session = Depends(get_db)):
+async def document_verification(request: DocumentRequest, db: Session = Depends(get_request_db)):
     """
     Record pathologist's confirmation click event.
     Updates case status to VERIFIED.
@@ -455,6 +648,7 @@ async def document_verification(request: DocumentRequest, db: Session = Depends(
             pathologist_name=request.pathologist_name,
             clicked_indicators=request.complexity_indicators_clicked
         )
+        _invalidate_case_cache(case.slide_id)
         
         return {
             "status": "documented",
@@ -471,11 +665,15 @@ async def document_verification(request: DocumentRequest, db: Session = Depends(
 # ===== Revenue Analytics (The Money View) =====
 
 @app.get("/api/performance-metrics")
-async def get_revenue_summary(db: Session = Depends(get_db)):
+async def get_revenue_summary(db: Session = Depends(get_request_db)):
     """
     Get the 2.5% Recovery Dashboard metrics.
     This is what gets partnerships.
     """
+    cached = _summary_cache.get("summary")
+    if cached is not None:
+        return cached
+    
     try:
         summary = RevenueService.get_summary(db)
         
@@ -483,19 +681,22 @@ async def get_revenue_summary(db: Session = Depends(get_db)):
         monthly_cases = summary["total_cases_processed"]
         annual_projection = summary["total_revenue_recovered"] * 12 if monthly_cases > 0 else 0
         
-        return {
+        result = {
             **summary,
             "annual_projection": round(annual_projection, 2),
             "efficiency_message": f"Saving {summary['efficiency_gain_hours']} hours of documentation time"
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to calculate summary: {str(e)}")
+    
+    _summary_cache["summary"] = result
+    return result
 
 
 # ===== PDF Export (The Deliverable) =====
 
 @app.get("/api/export-pdf")
-async def export_pdf(slide_id: str, db: Session = Depends(get_db)):
+async def export_pdf(slide_id: str, db: Session = Depends(get_request_db)):
     """
     Generate the "Audit Shield" PDF using ReportLab.
     This is the product - the PDF that stops Medicare audits.
@@ -509,6 +710,7 @@ async def export_pdf(slide_id: str, db: Session = Depends(get_db)):
         if case:
             # Mark as exported
             CaseService.mark_exported(db, case)
+            _invalidate_case_cache(case.slide_id)
             
             pathologist_name = case.verified_by or pathologist_name
             billing_data = {
@@ -528,21 +730,17 @@ async def export_pdf(slide_id: str, db: Session = Depends(get_db)):
                 }
             }
         
-        pdf_path = await pdf_generator.generate_audit_report(
+        pdf_bytes = await pdf_generator.generate_audit_report(
             slide_id=slide_id,
             billing_data=billing_data,
             pathologist_name=pathologist_name
         )
         
-        # Verify file exists
-        if not os.path.exists(pdf_path):
-            raise HTTPException(status_code=404, detail="PDF file not found on server")
-        
-        # FileResponse handles Content-Disposition automatically with filename parameter
-        return FileResponse(
-            path=pdf_path,
-            filename=f"audit_shield_{slide_id}.pdf",
-            media_type="application/pdf"
+        # PDF is rendered in memory - stream the bytes straight back
+        return Response(
+            content=pdf_bytes,
+            media_type="application/pdf",
+            headers={"Content-Disposition": f'attachment; filename="audit_shield_{slide_id}.pdf"'}
         )
     except HTTPException:
         raise
@@ -551,7 +749,7 @@ async def export_pdf(slide_id: str, db: Session = Depends(get_db)):
 
 
 @app.get("/api/cases/{slide_id}/download-shield")
-async def download_shield_pdf(slide_id: str, db: Session = Depends(get_db)):
+async def download_shield_pdf(slide_id: str, db: Session = Depends(get_request_db)):
     """
     Institutional Route for Audit Shield PDF.
     Wraps the export logic with the official naming convention.
@@ -5,15 +5,59 @@ SQLAlchemy ORM for SQLite persistence
 Standard 2026 Startup Schema
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, JSON
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, Text, JSON, Index
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.mutable import MutableList
+from sqlalchemy.orm import sessionmaker, Session
+from contextvars import ContextVar
 from datetime import datetime
+from typing import Optional
+import json
 import os
 
+try:
+    import orjson
+    
+    def _json_serializer(obj) -> str:
+        return orjson.dumps(obj, default=str).decode()
+    _json_deserializer = orjson.loads
+except ImportError:  # stdlib fallback
+    _json_serializer = json.dumps
+    _json_deserializer = json.loads
+
 # Database setup
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./patho.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Keep a pool of warm connections instead of reopening the .db/-wal/-shm
+# files for every request; sized for concurrent analyze fan-out
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": 30} if IS_SQLITE else {},
+    poolclass=QueuePool,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "40")),
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    # audit_log and other JSON columns go through orjson on every write/read
+    json_serializer=_json_serializer,
+    json_deserializer=_json_deserializer,
+)
+
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """WAL lets readers run alongside the writer; mmap serves reads from page cache."""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        cursor.execute("PRAGMA cache_size=-64000")    # ~64 MB
+        cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -68,7 +112,16 @@ class PathologyCase(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Full audit log
-    audit_log = Column(JSON)  # [{action, timestamp, user, details}]
+    audit_log = Column(MutableList.as_mutable(JSON), default=list)  # [{action, timestamp, user, details}]
+    
+    __table_args__ = (
+        # Status-filtered list view, newest first
+        Index("ix_cases_status_created", status, created_at.desc()),
+        # Slide lookups that also check workflow status
+        Index("ix_cases_slide_status", slide_id, status),
+        # Revenue dashboard GROUP BY on the CPT upgrade pair
+        Index("ix_cases_cpt_pair", base_cpt_code, suggested_cpt_code),
+    )
 
 
 class RevenueSummary(Base):
@@ -97,6 +150,32 @@ class RevenueSummary(Base):
     cpt_upgrade_breakdown = Column(JSON)  # {"88305→88307": 5, "88305→88309": 12}
 
 
+class CaseRevenueTotals(Base):
+    """
+    Running totals over all ANALYZED/VERIFIED/EXPORTED cases (single row, id=1).
+    Maintained by triggers on the cases table so the dashboard reads O(1).
+    """
+    __tablename__ = "case_revenue_totals"
+    
+    id = Column(Integer, primary_key=True)
+    total_cases = Column(Integer, default=0)
+    total_recovered = Column(Float, default=0.0)
+    audit_score_sum = Column(Integer, default=0)
+    cases_audit_ready = Column(Integer, default=0)  # Score >= 90
+
+
+class CptPairCount(Base):
+    """
+    In-scope case count per (base, suggested) CPT pair, maintained by triggers.
+    Rows may drop to 0 cases; readers filter those out.
+    """
+    __tablename__ = "cpt_pair_counts"
+    
+    base_cpt_code = Column(String(20), primary_key=True)
+    suggested_cpt_code = Column(String(50), primary_key=True)
+    cases = Column(Integer, default=0)
+
+
 class AuditEvent(Base):
     """
     Immutable audit trail for compliance.
@@ -112,14 +191,123 @@ class AuditEvent(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
 
+# Incremental revenue aggregates (SQLite). Each trigger subtracts the old
+# row's contribution and adds the new one; "in scope" is 0/1 - spelled as a
+# CASE so a NULL status counts as 0 instead of turning the totals NULL.
+_IN_SCOPE = "IN ('ANALYZED', 'VERIFIED', 'EXPORTED')"
+_HAS_PAIR = "COALESCE({row}.base_cpt_code, '') != '' AND COALESCE({row}.suggested_cpt_code, '') != ''"
+
+
+def _totals_delta(sign: str, row: str) -> str:
+    """SET-clause terms adding (sign='+') or removing (sign='-') one row's contribution."""
+    scope = f"(CASE WHEN {row}.status {_IN_SCOPE} THEN 1 ELSE 0 END)"
+    score = f"COALESCE({row}.audit_defense_score, 0)"
+    return (
+        f"total_cases = total_cases {sign} {scope}, "
+        f"total_recovered = total_recovered {sign} {scope} * COALESCE({row}.recovery_value, 0), "
+        f"audit_score_sum = audit_score_sum {sign} {scope} * {score}, "
+        f"cases_audit_ready = cases_audit_ready {sign} {scope} * ({score} >= 90)"
+    )
+
+
+def _pair_add(row: str) -> str:
+    return (
+        f"INSERT OR IGNORE INTO cpt_pair_counts (base_cpt_code, suggested_cpt_code, cases) "
+        f"SELECT {row}.base_cpt_code, {row}.suggested_cpt_code, 0 "
+        f"WHERE {row}.status {_IN_SCOPE} AND {_HAS_PAIR.format(row=row)}; "
+        f"UPDATE cpt_pair_counts SET cases = cases + 1 "
+        f"WHERE {row}.status {_IN_SCOPE} AND {_HAS_PAIR.format(row=row)} "
+        f"AND base_cpt_code = {row}.base_cpt_code AND suggested_cpt_code = {row}.suggested_cpt_code;"
+    )
+
+
+def _pair_remove(row: str) -> str:
+    return (
+        f"UPDATE cpt_pair_counts SET cases = cases - 1 "
+        f"WHERE {row}.status {_IN_SCOPE} AND {_HAS_PAIR.format(row=row)} "
+        f"AND base_cpt_code = {row}.base_cpt_code AND suggested_cpt_code = {row}.suggested_cpt_code;"
+    )
+
+
+_SQLITE_REVENUE_TRIGGER_NAMES = (
+    "trg_cases_revenue_insert",
+    "trg_cases_revenue_delete",
+    "trg_cases_revenue_update",
+)
+
+_SQLITE_REVENUE_TRIGGERS = (
+    f"""CREATE TRIGGER trg_cases_revenue_insert AFTER INSERT ON cases
+    BEGIN
+        UPDATE case_revenue_totals SET {_totals_delta('+', 'NEW')} WHERE id = 1;
+        {_pair_add('NEW')}
+    END""",
+    f"""CREATE TRIGGER trg_cases_revenue_delete AFTER DELETE ON cases
+    BEGIN
+        UPDATE case_revenue_totals SET {_totals_delta('-', 'OLD')} WHERE id = 1;
+        {_pair_remove('OLD')}
+    END""",
+    f"""CREATE TRIGGER trg_cases_revenue_update
+    AFTER UPDATE OF status, recovery_value, audit_defense_score, base_cpt_code, suggested_cpt_code ON cases
+    BEGIN
+        UPDATE case_revenue_totals SET {_totals_delta('-', 'OLD')} WHERE id = 1;
+        UPDATE case_revenue_totals SET {_totals_delta('+', 'NEW')} WHERE id = 1;
+        {_pair_remove('OLD')}
+        {_pair_add('NEW')}
+    END""",
+)
+
+# Full recompute from cases - run when the totals row doesn't exist yet (or
+# was nulled out by the pre-CASE triggers)
+_SQLITE_REVENUE_BACKFILL = (
+    f"""INSERT OR REPLACE INTO case_revenue_totals
+        (id, total_cases, total_recovered, audit_score_sum, cases_audit_ready)
+    SELECT 1, COUNT(*), COALESCE(SUM(recovery_value), 0),
+           COALESCE(SUM(COALESCE(audit_defense_score, 0)), 0),
+           COALESCE(SUM(COALESCE(audit_defense_score, 0) >= 90), 0)
+    FROM cases WHERE status {_IN_SCOPE}""",
+    "DELETE FROM cpt_pair_counts",
+    f"""INSERT INTO cpt_pair_counts (base_cpt_code, suggested_cpt_code, cases)
+    SELECT base_cpt_code, suggested_cpt_code, COUNT(*)
+    FROM cases WHERE status {_IN_SCOPE} AND {_HAS_PAIR.format(row='cases')}
+    GROUP BY base_cpt_code, suggested_cpt_code""",
+)
+
+
+def _install_revenue_triggers():
+    """Create the aggregate triggers and seed the totals on first run (SQLite only)."""
+    with engine.begin() as conn:
+        # Recreate rather than IF NOT EXISTS, so older trigger bodies get replaced
+        for name in _SQLITE_REVENUE_TRIGGER_NAMES:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+        for ddl in _SQLITE_REVENUE_TRIGGERS:
+            conn.exec_driver_sql(ddl)
+        totals = conn.exec_driver_sql(
+            "SELECT 1 FROM case_revenue_totals "
+            "WHERE id = 1 AND total_cases IS NOT NULL AND total_recovered IS NOT NULL "
+            "AND audit_score_sum IS NOT NULL AND cases_audit_ready IS NOT NULL"
+        ).first()
+        if totals is None:
+            for stmt in _SQLITE_REVENUE_BACKFILL:
+                conn.exec_driver_sql(stmt)
+
+
 # Database initialization
 def init_db():
-    """Create all tables."""
+    """Create all tables, plus any indexes added since a table was created."""
     Base.metadata.create_all(bind=engine)
+    
+    # create_all skips existing tables entirely, so older databases would
+    # never get new indexes; checkfirst makes this a no-op once they exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    
+    if IS_SQLITE:
+        _install_revenue_triggers()
 
 
 def get_db():
-    """Dependency for FastAPI routes."""
+    """Generator dependency (scripts and apps without DBSessionMiddleware)."""
     db = SessionLocal()
     try:
         yield db
@@ -127,5 +315,80 @@ def get_db():
         db.close()
 
 
+# Session bound to the request currently being handled
+_session_cv: ContextVar[Optional[Session]] = ContextVar("db_session", default=None)
+
+# AuditEvent rows queued during the current request, inserted in one batch
+_pending_audit_cv: ContextVar[Optional[list]] = ContextVar("pending_audit_events", default=None)
+
+
+def add_audit_event(db: Session, **fields) -> None:
+    """
+    Record an AuditEvent row.
+    Inside a request it is queued and bulk-inserted before the response
+    starts; otherwise it is added to db and written on the caller's commit.
+    """
+    pending = _pending_audit_cv.get()
+    if pending is not None:
+        pending.append(fields)
+    else:
+        db.add(AuditEvent(**fields))
+
+
+def _flush_audit_events(db: Session, pending: list) -> None:
+    """Insert all queued audit rows in a single transaction."""
+    rows = pending[:]
+    pending.clear()
+    try:
+        db.bulk_insert_mappings(AuditEvent, rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+class DBSessionMiddleware:
+    """
+    Pure ASGI middleware that opens one Session per HTTP request.
+    Avoids the threadpool hops FastAPI needs to enter and exit a sync
+    generator dependency like get_db. Audit events queued by the route
+    are committed in one batch just before the response is sent.
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        db = SessionLocal()
+        pending = []
+        token = _session_cv.set(db)
+        pending_token = _pending_audit_cv.set(pending)
+        
+        async def send_with_audit_flush(message):
+            if message["type"] == "http.response.start" and pending:
+                _flush_audit_events(db, pending)
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_audit_flush)
+        finally:
+            try:
+                if pending:
+                    _flush_audit_events(db, pending)
+            finally:
+                _pending_audit_cv.reset(pending_token)
+                _session_cv.reset(token)
+                db.close()
+
+
+async def get_request_db() -> Session:
+    """Dependency for FastAPI routes - the Session opened by DBSessionMiddleware."""
+    return _session_cv.get()
+
+
 # Initialize on import
 init_db()
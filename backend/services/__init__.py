@@ -2,5 +2,6 @@
 from .billing_agent import BillingAgent
 from .pdf_generator import PDFGenerator
 from .db_service import CaseService, RevenueService
+from .llm_cache import LLMCache
 
-__all__ = ["BillingAgent", "PDFGenerator", "CaseService", "RevenueService"]
+__all__ = ["BillingAgent", "PDFGenerator", "CaseService", "RevenueService", "LLMCache"]
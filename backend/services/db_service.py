@@ -4,17 +4,39 @@ CRUD operations for case management and revenue tracking.
 """
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select, update, cast, literal, JSON, case as sql_case
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 from typing import Optional, List
-import json
 import sys
 import os
 
 # Add parent directory to path for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from models import PathologyCase, RevenueSummary, AuditEvent, get_db, SessionLocal
+from models import (
+    PathologyCase, RevenueSummary, CaseRevenueTotals, CptPairCount,
+    get_db, SessionLocal, add_audit_event
+)
+
+# Columns projected by the case list endpoint (order matters for unpacking)
+_CASE_LIST_COLS = (
+    PathologyCase.id,
+    PathologyCase.patient_id,
+    PathologyCase.patient_name,
+    PathologyCase.slide_id,
+    PathologyCase.diagnosis,
+    PathologyCase.status,
+    PathologyCase.image_url,
+    PathologyCase.base_cpt_code,
+    PathologyCase.suggested_cpt_code,
+    PathologyCase.recovery_value,
+    PathologyCase.confidence_score,
+    PathologyCase.created_at,
+)
+
+# Fields clients may edit through PUT /api/cases/{slide_id}
+CASE_EDITABLE_FIELDS = ("patient_name", "diagnosis", "patient_id")
 
 
 class CaseService:
@@ -53,20 +75,98 @@ class CaseService:
     @staticmethod
     def get_case_by_slide_id(db: Session, slide_id: str) -> Optional[PathologyCase]:
         """Get case by slide ID."""
-        return db.query(PathologyCase).filter(PathologyCase.slide_id == slide_id).first()
+        stmt = select(PathologyCase).where(PathologyCase.slide_id == slide_id).limit(1)
+        return db.execute(stmt).scalar_one_or_none()
     
     @staticmethod
     def get_case_by_id(db: Session, case_id: int) -> Optional[PathologyCase]:
         """Get case by primary key."""
-        return db.query(PathologyCase).filter(PathologyCase.id == case_id).first()
+        return db.get(PathologyCase, case_id)
     
     @staticmethod
     def get_all_cases(db: Session, status: str = None) -> List[PathologyCase]:
         """Get all cases, optionally filtered by status."""
-        query = db.query(PathologyCase)
+        stmt = select(PathologyCase)
+        if status:
+            stmt = stmt.where(PathologyCase.status == status)
+        return db.execute(stmt.order_by(PathologyCase.created_at.desc())).scalars().all()
+    
+    @staticmethod
+    def get_case_list_rows(db: Session, status: str = None) -> list:
+        """
+        Get the list-view columns for all cases as plain row tuples.
+        Skips ORM instance construction and the identity map.
+        """
+        stmt = select(*_CASE_LIST_COLS)
         if status:
-            query = query.filter(PathologyCase.status == status)
-        return query.order_by(PathologyCase.created_at.desc()).all()
+            stmt = stmt.where(PathologyCase.status == status)
+        return db.execute(stmt.order_by(PathologyCase.created_at.desc())).all()
+    
+    @staticmethod
+    def update_case_fields(db: Session, slide_id: str, values: dict):
+        """
+        Update columns on a case with a single UPDATE ... RETURNING.
+        Does not commit - the caller owns the transaction.
+        
+        Returns:
+            Row of (slide_id, patient_name, diagnosis, patient_id, image_url),
+            or None if no case has this slide ID
+        """
+        returning = (
+            PathologyCase.slide_id,
+            PathologyCase.patient_name,
+            PathologyCase.diagnosis,
+            PathologyCase.patient_id,
+            PathologyCase.image_url,
+        )
+        if not values:
+            stmt = select(*returning).where(PathologyCase.slide_id == slide_id)
+        else:
+            stmt = (
+                update(PathologyCase)
+                .where(PathologyCase.slide_id == slide_id)
+                .values(**values)
+                .returning(*returning)
+            )
+        return db.execute(stmt).one_or_none()
+    
+    @staticmethod
+    def _append_audit(db: Session, case: PathologyCase, entry: dict) -> None:
+        """
+        Append one entry to case.audit_log inside the current transaction.
+        
+        On SQLite and PostgreSQL the append happens server-side in a single
+        UPDATE, so the write stays constant-size however long the log gets.
+        Other databases fall back to rewriting the list from Python.
+        """
+        dialect = db.get_bind().dialect.name
+        column = PathologyCase.audit_log
+        entry_json = literal(entry, JSON)
+        
+        if dialect == "sqlite":
+            appended = func.json_insert(func.coalesce(column, "[]"), "$[#]", func.json(entry_json))
+        elif dialect == "postgresql":
+            appended = cast(
+                cast(func.coalesce(column, cast("[]", JSON)), JSONB).op("||")(
+                    func.jsonb_build_array(cast(entry_json, JSONB))
+                ),
+                JSON
+            )
+        else:
+            if case.audit_log is None:  # rows written before default=list
+                case.audit_log = [entry]
+            else:
+                case.audit_log.append(entry)  # MutableList flags the column dirty
+            return
+        
+        # Core UPDATE bypasses the ORM; expire the stale loaded copy so the
+        # next access reloads it (callers commit + refresh right after anyway)
+        db.execute(
+            update(PathologyCase.__table__)
+            .where(PathologyCase.__table__.c.id == case.id)
+            .values(audit_log=appended)
+        )
+        db.expire(case, ["audit_log"])
     
     @staticmethod
     def update_with_analysis(
@@ -100,9 +200,7 @@ class CaseService:
         case.status = "ANALYZED"
         
         # Audit log
-        if case.audit_log is None:
-            case.audit_log = []
-        case.audit_log.append({
+        CaseService._append_audit(db, case, {
             "action": "ANALYZED",
             "timestamp": datetime.utcnow().isoformat(),
             "details": f"AI analysis complete. Confidence: {case.confidence_score:.2%}"
@@ -120,16 +218,15 @@ class CaseService:
         clicked_indicators: List[str] = None
     ) -> PathologyCase:
         """Mark case as verified by pathologist."""
+        now = datetime.utcnow()
         case.status = "VERIFIED"
         case.verified_by = pathologist_name
-        case.verified_at = datetime.utcnow()
+        case.verified_at = now
         
         # Audit log
-        if case.audit_log is None:
-            case.audit_log = []
-        case.audit_log.append({
+        CaseService._append_audit(db, case, {
             "action": "VERIFIED",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": now.isoformat(),
             "user": pathologist_name,
             "details": f"Verified with {len(clicked_indicators or [])} complexity indicators confirmed"
         })
@@ -145,14 +242,13 @@ class CaseService:
     @staticmethod
     def mark_exported(db: Session, case: PathologyCase) -> PathologyCase:
         """Mark case as exported (PDF generated)."""
+        now = datetime.utcnow()
         case.status = "EXPORTED"
-        case.exported_at = datetime.utcnow()
+        case.exported_at = now
         
-        if case.audit_log is None:
-            case.audit_log = []
-        case.audit_log.append({
+        CaseService._append_audit(db, case, {
             "action": "EXPORTED",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": now.isoformat(),
             "details": "Audit Shield PDF generated"
         })
         
@@ -168,24 +264,21 @@ class CaseService:
         user: str = "pathologist"
     ) -> None:
         """Log when a user clicks a region in the interactive viewer."""
-        if case.audit_log is None:
-            case.audit_log = []
-        case.audit_log.append({
+        CaseService._append_audit(db, case, {
             "action": "REGION_CLICKED",
             "timestamp": datetime.utcnow().isoformat(),
             "user": user,
             "details": f"Examined region: {region_label}"
         })
-        db.commit()
         
-        # Also log to audit events table
-        event = AuditEvent(
+        # Also log to audit events table (batched per request)
+        add_audit_event(
+            db,
             case_id=case.id,
             event_type="REGION_CLICKED",
             event_data={"region": region_label},
             user_id=user
         )
-        db.add(event)
         db.commit()
 
 
@@ -194,14 +287,60 @@ class RevenueService:
     Service for revenue tracking and analytics.
     """
     
+    @staticmethod
+    def _materialized_totals(db: Session):
+        """
+        Read the trigger-maintained aggregates (SQLite).
+        Returns None when they aren't available (other databases).
+        """
+        totals = db.get(CaseRevenueTotals, 1)
+        if totals is None:
+            return None
+        
+        cpt_pairs = db.query(
+            CptPairCount.base_cpt_code, CptPairCount.suggested_cpt_code, CptPairCount.cases
+        ).filter(CptPairCount.cases > 0).all()
+        avg_audit = totals.audit_score_sum / totals.total_cases if totals.total_cases else 0.0
+        return totals.total_cases, totals.total_recovered, avg_audit, totals.cases_audit_ready, cpt_pairs
+    
+    @staticmethod
+    def _scanned_totals(db: Session):
+        """Compute the aggregates from the cases table directly."""
+        in_scope = PathologyCase.status.in_(["VERIFIED", "EXPORTED", "ANALYZED"])
+        audit_score = func.coalesce(PathologyCase.audit_defense_score, 0)
+        
+        # All scalar metrics in a single scan of the cases table
+        total_cases, total_recovered, avg_audit, audit_ready = db.query(
+            func.count(PathologyCase.id),
+            func.coalesce(func.sum(PathologyCase.recovery_value), 0.0),
+            func.coalesce(func.avg(audit_score), 0.0),
+            func.coalesce(func.sum(sql_case((audit_score >= 90, 1), else_=0)), 0),
+        ).filter(in_scope).one()
+        
+        # CPT breakdown - one row per (base, suggested) pair, counted in SQL
+        cpt_pairs = db.query(
+            PathologyCase.base_cpt_code,
+            PathologyCase.suggested_cpt_code,
+            func.count(PathologyCase.id)
+        ).filter(
+            in_scope,
+            PathologyCase.base_cpt_code.isnot(None),
+            PathologyCase.base_cpt_code != "",
+            PathologyCase.suggested_cpt_code.isnot(None),
+            PathologyCase.suggested_cpt_code != "",
+        ).group_by(
+            PathologyCase.base_cpt_code, PathologyCase.suggested_cpt_code
+        ).all()
+        return total_cases, total_recovered, avg_audit, audit_ready, cpt_pairs
+    
     @staticmethod
     def get_summary(db: Session) -> dict:
         """Get current revenue summary metrics."""
-        cases = db.query(PathologyCase).filter(
-            PathologyCase.status.in_(["VERIFIED", "EXPORTED", "ANALYZED"])
-        ).all()
+        # O(1) read from the materialized totals, else scan the cases table
+        totals = RevenueService._materialized_totals(db) or RevenueService._scanned_totals(db)
+        total_cases, total_recovered, avg_audit, audit_ready, cpt_pairs = totals
         
-        if not cases:
+        if not total_cases:
             return {
                 "total_cases_processed": 0,
                 "total_revenue_recovered": 0.0,
@@ -212,26 +351,17 @@ class RevenueService:
                 "cpt_breakdown": {}
             }
         
-        total_recovered = sum(c.recovery_value or 0 for c in cases)
-        avg_recovery = total_recovered / len(cases) if cases else 0
-        avg_audit = sum(c.audit_defense_score or 0 for c in cases) / len(cases)
-        audit_ready = len([c for c in cases if (c.audit_defense_score or 0) >= 90])
-        
-        # CPT breakdown
-        cpt_breakdown = {}
-        for case in cases:
-            if case.base_cpt_code and case.suggested_cpt_code:
-                key = f"{case.base_cpt_code}→{case.suggested_cpt_code}"
-                cpt_breakdown[key] = cpt_breakdown.get(key, 0) + 1
+        avg_recovery = total_recovered / total_cases
+        cpt_breakdown = {f"{base}→{suggested}": count for base, suggested, count in cpt_pairs}
         
         # Efficiency: assume 8 minutes saved per case vs 15 min national average
-        efficiency_hours = (len(cases) * 8) / 60
+        efficiency_hours = (total_cases * 8) / 60
         
         return {
-            "total_cases_processed": len(cases),
+            "total_cases_processed": total_cases,
             "total_revenue_recovered": round(total_recovered, 2),
             "average_recovery_per_case": round(avg_recovery, 2),
-            "average_audit_score": round(avg_audit, 1),
+            "average_audit_score": round(float(avg_audit), 1),  # AVG may be Decimal on Postgres
             "cases_audit_ready": audit_ready,
             "efficiency_gain_hours": round(efficiency_hours, 1),
             "cpt_breakdown": cpt_breakdown
@@ -241,14 +371,15 @@ class RevenueService:
     def update_summary(db: Session, case: PathologyCase) -> None:
         """Update revenue summary after case verification."""
         # Get or create today's summary
-        today = datetime.utcnow().date()
+        now = datetime.utcnow()
+        today = now.date()
         summary = db.query(RevenueSummary).filter(
             func.date(RevenueSummary.date) == today
         ).first()
         
         if not summary:
             summary = RevenueSummary(
-                date=datetime.utcnow(),
+                date=now,
                 total_cases_processed=0,
                 total_revenue_recovered=0.0,
                 average_recovery_per_case=0.0,
@@ -284,8 +415,8 @@ def seed_demo_data():
     """Populate database with demo cases for presentation."""
     db = SessionLocal()
     
-    # Check if already seeded
-    if db.query(PathologyCase).count() > 0:
+    # Check if already seeded (existence probe, not a full COUNT scan)
+    if db.query(PathologyCase.id).limit(1).scalar() is not None:
         db.close()
         return
     
@@ -332,14 +463,18 @@ def seed_demo_data():
         }
     ]
     
-    for case_data in demo_cases:
-        case = PathologyCase(**case_data, audit_log=[{
+    created_at = datetime.utcnow().isoformat()
+    rows = [
+        {**case_data, "audit_log": [{
             "action": "CREATED",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": created_at,
             "details": "Demo case seeded"
-        }])
-        db.add(case)
+        }]}
+        for case_data in demo_cases
+    ]
     
+    # One executemany INSERT, skipping the per-object unit-of-work bookkeeping
+    db.bulk_insert_mappings(PathologyCase, rows)
     db.commit()
     db.close()
     print(f"[OK] Seeded {len(demo_cases)} demo cases")
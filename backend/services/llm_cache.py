@@ -0,0 +1,224 @@
+"""
+LLM Response Cache
+Two-tier cache for Gemini billing analyses: exact match on a canonical
+request hash, then optional nearest-neighbour match on request embeddings.
+Optionally persisted to a SQLite file so hits survive restarts.
+"""
+
+import copy
+import hashlib
+import json
+import math
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List
+
+
+class LLMCache:
+    """
+    Bounded LRU cache of LLM responses.
+
+    - Exact tier: sha256 of the canonical (sorted-key) JSON request payload
+    - Semantic tier: cosine similarity between request embeddings; a stored
+      response is reused when similarity exceeds the threshold and it was
+      stored under the same scope (inputs the embedding doesn't capture)
+
+    Stored and returned values are deep copies, so callers may mutate them.
+    Not thread-safe - use from a single event loop.
+
+    Entries older than ttl seconds (if set) are treated as misses.
+
+    With persist_path set, entries are written through to a SQLite file and
+    the most recently stored ones are reloaded on startup. Each row records
+    the cache version and when it was stored; rows from another version
+    (prompt, rules or model changed) or past the ttl are dropped on load.
+    Lookups stay in-memory; file writes go through one background thread so
+    put() never blocks the event loop on SQLite.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 2048,
+        similarity_threshold: float = 0.92,
+        persist_path: Optional[str] = None,
+        version: str = "",
+        ttl: Optional[float] = None
+    ):
+        self.maxsize = maxsize
+        self.similarity_threshold = similarity_threshold
+        self.version = version
+        self.ttl = ttl
+        self._responses: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._embeddings: Dict[str, List[float]] = {}  # key -> unit vector
+        self._scopes: Dict[str, str] = {}  # key -> semantic-match scope
+        self._stored_at: Dict[str, float] = {}  # key -> time.time() of put
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0}
+
+        self._db = None
+        self._writer = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(llm_cache)")}
+            if columns and not {"version", "scope"} <= columns:
+                # Rows from an older layout can't be validated - start over
+                self._db.execute("DROP TABLE llm_cache")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, embedding TEXT, "
+                "scope TEXT NOT NULL DEFAULT '', version TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._load()
+            # Single worker, so writes land in submission order
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm-cache-writer")
+
+    def _load(self) -> None:
+        """Warm the in-memory tiers from disk, newest entries last (most recent in LRU order)."""
+        cutoff = time.time() - self.ttl if self.ttl else 0.0
+        self._db.execute(
+            "DELETE FROM llm_cache WHERE version != ? OR created_at < ?",
+            (self.version, cutoff)
+        )
+        rows = self._db.execute(
+            "SELECT key, response, embedding, scope, created_at FROM llm_cache ORDER BY rowid DESC LIMIT ?",
+            (self.maxsize,)
+        ).fetchall()
+        for key, response, embedding, scope, created_at in reversed(rows):
+            self._responses[key] = json.loads(response)
+            self._stored_at[key] = created_at
+            if embedding:
+                self._embeddings[key] = json.loads(embedding)
+                self._scopes[key] = scope
+
+    def _expired(self, key: str) -> bool:
+        return bool(self.ttl) and time.time() - self._stored_at.get(key, 0.0) > self.ttl
+
+    def _drop(self, keys: List[str]) -> None:
+        """Remove entries from memory and (in the background) from disk."""
+        for key in keys:
+            self._responses.pop(key, None)
+            self._embeddings.pop(key, None)
+            self._scopes.pop(key, None)
+            self._stored_at.pop(key, None)
+        if self._writer is not None and keys:
+            self._submit(
+                self._db.executemany, "DELETE FROM llm_cache WHERE key = ?", [(key,) for key in keys]
+            )
+
+    def _submit(self, fn, *args) -> None:
+        """Queue a SQLite write on the writer thread; failures are logged, not raised."""
+        def report(fut):
+            if fut.exception() is not None:
+                print(f"⚠️  LLM cache write failed: {fut.exception()}")
+        self._writer.submit(fn, *args).add_done_callback(report)
+
+    def close(self) -> None:
+        """Wait for queued writes to reach the file, then close it."""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._db.close()
+            self._writer = self._db = None
+
+    @staticmethod
+    def make_key(payload: Dict[str, Any]) -> str:
+        """Stable hash of a request payload (dict key order doesn't matter)."""
+        canonical = json.dumps(payload, sort_keys=True, default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Exact-match lookup."""
+        response = self._responses.get(key)
+        if response is None:
+            return None
+        if self._expired(key):
+            self._drop([key])
+            return None
+        self._responses.move_to_end(key)
+        self.stats["hits"] += 1
+        return copy.deepcopy(response)
+
+    def get_similar(self, embedding: List[float], scope: str = "") -> Optional[Dict[str, Any]]:
+        """Return the closest stored response in scope above the similarity threshold."""
+        query = self._normalize(embedding)
+        if query is None:
+            return None
+
+        best_key, best_score = None, self.similarity_threshold
+        expired = []
+        for key, vector in self._embeddings.items():
+            if self._expired(key):
+                expired.append(key)
+                continue
+            if self._scopes.get(key) != scope:
+                continue
+            score = sum(a * b for a, b in zip(query, vector))
+            if score > best_score:
+                best_key, best_score = key, score
+        self._drop(expired)
+
+        if best_key is None:
+            return None
+        self._responses.move_to_end(best_key)
+        self.stats["semantic_hits"] += 1
+        return copy.deepcopy(self._responses[best_key])
+
+    def put(
+        self,
+        key: str,
+        response: Dict[str, Any],
+        embedding: Optional[List[float]] = None,
+        scope: str = ""
+    ) -> None:
+        """Store a response (and its request embedding, if any, under scope)."""
+        now = time.time()
+        self._responses[key] = copy.deepcopy(response)
+        self._responses.move_to_end(key)
+        self._stored_at[key] = now
+        if embedding is not None:
+            vector = self._normalize(embedding)
+            if vector is not None:
+                self._embeddings[key] = vector
+                self._scopes[key] = scope
+
+        if self._writer is not None:
+            vector = self._embeddings.get(key)
+            # REPLACE re-inserts the row, so rowid order tracks recency of puts.
+            # Serialized here, so later mutation by the caller can't leak in.
+            self._submit(
+                self._db.execute,
+                "INSERT OR REPLACE INTO llm_cache (key, response, embedding, scope, version, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, json.dumps(response, default=str), json.dumps(vector) if vector else None,
+                 scope, self.version, now)
+            )
+
+        evicted_keys = []
+        while len(self._responses) > self.maxsize:
+            evicted_keys.append(self._responses.popitem(last=False)[0])
+        self._drop(evicted_keys)
+
+    def record_miss(self) -> None:
+        """Count a lookup that missed both tiers."""
+        self.stats["misses"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current size."""
+        lookups = self.stats["hits"] + self.stats["semantic_hits"] + self.stats["misses"]
+        hits = self.stats["hits"] + self.stats["semantic_hits"]
+        return {
+            **self.stats,
+            "size": len(self._responses),
+            "persistent": self._db is not None,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0
+        }
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> Optional[List[float]]:
+        """Scale to unit length so similarity is a plain dot product."""
+        norm = math.sqrt(sum(v * v for v in vector))
+        if not norm:
+            return None
+        return [v / norm for v in vector]
@@ -2,43 +2,216 @@
 Local JSON Database for MVP
 Simple file-based persistence for documented cases.
 For production, migrate to PostgreSQL.
+
+Standalone: the API (main.py) and the other services persist through
+SQLAlchemy (models.py / db_service.py) and do not import this module. It is
+kept for offline scripts and inspection (python -m services.local_db).
 """
 
+import asyncio
 import json
 import os
+import queue
+import threading
+from concurrent.futures import Future
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from pathlib import Path
 
+try:
+    import orjson
+    
+    def _dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=str)
+    _loads = orjson.loads  # orjson.JSONDecodeError subclasses json.JSONDecodeError
+except ImportError:  # stdlib fallback
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), default=str).encode('utf-8')
+    _loads = json.loads
+
 
 class LocalDB:
     """
-    File-based JSON storage for documented billing cases.
-    Thread-safe operations with file locking.
+    Append-only JSONL storage for documented billing cases.
+    
+    Every add/update appends one full record to the log; the latest line for
+    an id wins. An in-memory index serves reads, so nothing re-parses the file
+    after startup. The log is compacted once stale lines outnumber live ones.
+    
+    All mutations go through one writer thread fed by a bounded queue, so
+    concurrent callers can't interleave read-modify-write; whatever is queued
+    together is applied in order and appended with a single write.
     """
     
-    def __init__(self, db_path: str = "backend/data/cases.json"):
+    COMPACT_MIN_LINES = 1000
+    WRITE_BATCH_SIZE = 64
+    
+    def __init__(self, db_path: str = "backend/data/cases.jsonl", fsync: bool = False):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        
+        self._by_id: Dict[str, Dict[str, Any]] = {}  # insertion-ordered
+        self._by_slide: Dict[str, str] = {}  # slide_id -> id
+        self._log_lines = 0
         
-        # Initialize DB file if not exists
-        if not self.db_path.exists():
-            self._write_db({"cases": [], "metadata": {"created": datetime.utcnow().isoformat()}})
+        if self.db_path.exists():
+            self._load()
+        else:
+            self._import_legacy()
+        
+        self._write_q: "queue.Queue" = queue.Queue(maxsize=1024)
+        self._writer = threading.Thread(target=self._writer_loop, name="localdb-writer", daemon=True)
+        self._writer.start()
+    
+    def _load(self) -> None:
+        """Replay the log into the in-memory index."""
+        with open(self.db_path, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = _loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn trailing write
+                self._index(record)
+                self._log_lines += 1
     
-    def _read_db(self) -> Dict[str, Any]:
-        """Read database file."""
+    def _import_legacy(self) -> None:
+        """One-time migration from the old single-document cases.json."""
+        legacy_path = self.db_path.with_suffix('.json')
         try:
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            with open(legacy_path, 'rb') as f:
+                cases = _loads(f.read()).get("cases", [])
         except (json.JSONDecodeError, FileNotFoundError):
-            return {"cases": [], "metadata": {"created": datetime.utcnow().isoformat()}}
+            cases = []
+        
+        for record in cases:
+            self._index(record)
+        self.compact_now()
+    
+    def _index(self, record: Dict[str, Any]) -> None:
+        previous = self._by_id.get(record["id"])
+        if previous and previous.get("slide_id") not in (None, record.get("slide_id")):
+            # Slide ID changed - drop the stale mapping (also on log replay)
+            if self._by_slide.get(previous["slide_id"]) == record["id"]:
+                del self._by_slide[previous["slide_id"]]
+        self._by_id[record["id"]] = record
+        if record.get("slide_id"):
+            self._by_slide[record["slide_id"]] = record["id"]
+    
+    # ===== Writer thread =====
+    
+    def _submit(self, op: str, *args) -> Future:
+        """Queue a mutation for the writer thread."""
+        fut: Future = Future()
+        self._write_q.put((op, args, fut))
+        return fut
+    
+    def _writer_loop(self) -> None:
+        """Drain queued ops in batches: apply each to the index, then append once."""
+        while True:
+            batch = [self._write_q.get()]
+            while len(batch) < self.WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._write_q.get_nowait())
+                except queue.Empty:
+                    break
+            
+            lines, done = [], []
+            stop = False
+            for op, args, fut in batch:
+                try:
+                    if op == "add":
+                        record = self._apply_add(*args)
+                    elif op == "update":
+                        record = self._apply_update(*args)
+                    else:
+                        record = None
+                        if op == "compact":
+                            # Anything queued ahead of the compact lands in the log first
+                            self._flush(lines)
+                            lines = []
+                            self.compact_now()
+                        stop = stop or op == "stop"
+                except Exception as e:
+                    fut.set_exception(e)
+                    continue
+                if record is not None:
+                    lines.append(_dumps(record))
+                done.append((fut, record))
+            
+            try:
+                self._flush(lines)
+            except Exception as e:
+                for fut, _ in done:
+                    fut.set_exception(e)
+            else:
+                for fut, record in done:
+                    # Callers get a copy; the index keeps the original
+                    fut.set_result(dict(record) if record is not None else None)
+            if stop:
+                return
+    
+    def _flush(self, lines: List[bytes]) -> None:
+        """Append encoded records to the log in one write."""
+        if not lines:
+            return
+        with open(self.db_path, 'ab') as f:
+            f.write(b"\n".join(lines) + b"\n")
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        self._log_lines += len(lines)
+        
+        if self._log_lines > max(self.COMPACT_MIN_LINES, 2 * len(self._by_id)):
+            self.compact_now()
+    
+    def _apply_add(self, case_data: Dict[str, Any]) -> Dict[str, Any]:
+        # Generate record
+        record = {
+            "id": f"DOC-{len(self._by_id) + 1:06d}",
+            "timestamp": datetime.utcnow().isoformat(),
+            **case_data
+        }
+        self._index(record)
+        return record
     
-    def _write_db(self, data: Dict[str, Any]) -> None:
-        """Write database file atomically."""
+    def _apply_update(self, case_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        case = self._lookup(case_id)
+        if case is None:
+            return None
+        
+        # Keep the original id so the appended line supersedes the old one
+        record = {**case, **updates, "id": case["id"], "updated_at": datetime.utcnow().isoformat()}
+        self._index(record)
+        return record
+    
+    def close(self) -> None:
+        """Flush queued writes and stop the writer thread."""
+        if self._writer.is_alive():
+            self._submit("stop").result()
+            self._writer.join()
+    
+    def compact(self) -> None:
+        """Rewrite the log with only the latest version of each record."""
+        self._submit("compact").result()
+    
+    def compact_now(self) -> None:
+        """compact() body; only call from the writer thread (or before it starts)."""
         temp_path = self.db_path.with_suffix('.tmp')
-        with open(temp_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, default=str)
+        with open(temp_path, 'wb') as f:
+            for record in self._by_id.values():
+                f.write(_dumps(record) + b"\n")
         temp_path.replace(self.db_path)
+        self._log_lines = len(self._by_id)
+    
+    def _lookup(self, case_id: str) -> Optional[Dict[str, Any]]:
+        """Find a case by document ID or slide ID."""
+        record = self._by_id.get(case_id)
+        if record is None and case_id in self._by_slide:
+            record = self._by_id.get(self._by_slide[case_id])
+        return record
     
     def add_case(self, case_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -50,69 +223,65 @@ class LocalDB:
         Returns:
             The saved case with generated ID and timestamp
         """
-        db = self._read_db()
-        
-        # Generate record
-        record = {
-            "id": f"DOC-{len(db['cases']) + 1:06d}",
-            "timestamp": datetime.utcnow().isoformat(),
-            **case_data
-        }
-        
-        db["cases"].append(record)
-        db["metadata"]["last_updated"] = datetime.utcnow().isoformat()
-        
-        self._write_db(db)
-        return record
+        return self._submit("add", case_data).result()
     
     def get_case(self, case_id: str) -> Optional[Dict[str, Any]]:
-        """Get a specific case by ID."""
-        db = self._read_db()
-        for case in db["cases"]:
-            if case.get("id") == case_id or case.get("slide_id") == case_id:
-                return case
-        return None
+        """Get a specific case by ID (a copy - mutating it doesn't touch the index)."""
+        record = self._lookup(case_id)
+        return dict(record) if record is not None else None
     
     def get_all_cases(self) -> List[Dict[str, Any]]:
-        """Get all documented cases."""
-        db = self._read_db()
-        return db["cases"]
+        """Get all documented cases (copies)."""
+        return [dict(c) for c in list(self._by_id.values())]
     
     def get_cases_by_status(self, status: str) -> List[Dict[str, Any]]:
-        """Get cases filtered by status."""
-        db = self._read_db()
-        return [c for c in db["cases"] if c.get("status") == status]
+        """Get cases filtered by status (copies)."""
+        return [dict(c) for c in list(self._by_id.values()) if c.get("status") == status]
     
     def update_case(self, case_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update an existing case."""
-        db = self._read_db()
-        
-        for i, case in enumerate(db["cases"]):
-            if case.get("id") == case_id or case.get("slide_id") == case_id:
-                db["cases"][i] = {**case, **updates, "updated_at": datetime.utcnow().isoformat()}
-                db["metadata"]["last_updated"] = datetime.utcnow().isoformat()
-                self._write_db(db)
-                return db["cases"][i]
-        
-        return None
+        return self._submit("update", case_id, updates).result()
+    
+    # ===== Async API =====
+    # Awaits the writer thread's future directly - no threadpool worker is
+    # tied up waiting on the append (and fsync, if enabled).
+    
+    async def add_case_async(self, case_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Non-blocking add_case for use from the event loop."""
+        return await asyncio.wrap_future(self._submit("add", case_data))
+    
+    async def update_case_async(self, case_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Non-blocking update_case for use from the event loop."""
+        return await asyncio.wrap_future(self._submit("update", case_id, updates))
+    
+    def dump_pretty(self) -> str:
+        """Indented JSON of all current cases, for human inspection only."""
+        return json.dumps({"cases": self.get_all_cases()}, indent=2, default=str, ensure_ascii=False)
     
     def get_revenue_summary(self) -> Dict[str, Any]:
         """Calculate total recovered revenue from documented cases."""
-        db = self._read_db()
+        cases = list(self._by_id.values())
         
-        total_recovered = sum(
-            case.get("revenue_delta", 0) 
-            for case in db["cases"] 
-            if case.get("status") == "verified"
-        )
+        # Single pass over the cases for both accumulators
+        total_recovered = 0
+        verified_cases = 0
+        for case in cases:
+            if case.get("status") == "verified":
+                verified_cases += 1
+                total_recovered += case.get("revenue_delta", 0)
         
         return {
-            "total_cases": len(db["cases"]),
-            "verified_cases": len([c for c in db["cases"] if c.get("status") == "verified"]),
+            "total_cases": len(cases),
+            "verified_cases": verified_cases,
             "total_recovered": round(total_recovered, 2),
-            "average_per_case": round(total_recovered / max(1, len(db["cases"])), 2)
+            "average_per_case": round(total_recovered / max(1, len(cases)), 2)
         }
 
 
 # Singleton instance
 db = LocalDB()
+
+
+if __name__ == "__main__":
+    # python -m services.local_db - print the documented cases, indented
+    print(db.dump_pretty())
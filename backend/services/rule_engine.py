@@ -0,0 +1,123 @@
+"""
+CPT Rule Engine
+Compiles json-logic style rules into plain Python functions at startup,
+so evaluating a rule is a straight-line branch tree instead of an
+interpreter walk over the JSON.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+RULES_PATH = Path(__file__).with_name("cpt_rules.json")
+
+_COMPARISONS = {"==": "==", "!=": "!=", ">": ">", ">=": ">=", "<": "<", "<=": "<="}
+
+
+def _var(findings: Dict[str, Any], path: str, default: Any = None) -> Any:
+    """Dotted lookup into findings ("tumor.grade"); default when missing."""
+    value: Any = findings
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return default
+        value = value[part]
+    return value
+
+
+def _num(value: Any) -> float:
+    """Numeric operand; non-numbers become NaN so ordering tests are False."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return float("nan")
+
+
+class _Compiler:
+    """Turns one rule AST into a Python expression, hoisting literals into constants."""
+    
+    def __init__(self):
+        self.constants: Dict[str, Any] = {}
+    
+    def const(self, value: Any) -> str:
+        name = f"_c{len(self.constants)}"
+        self.constants[name] = value
+        return name
+    
+    def operand(self, node: Any) -> str:
+        """Numeric operand of an ordering test; number literals are inlined as-is."""
+        if isinstance(node, (int, float)) and not isinstance(node, bool):
+            return repr(node)
+        return f"_num({self.expr(node)})"
+    
+    def expr(self, node: Any) -> str:
+        if not isinstance(node, dict):
+            if isinstance(node, list):
+                return self.const(tuple(node))
+            return repr(node) if isinstance(node, (str, int, float, bool, type(None))) else self.const(node)
+        
+        if len(node) != 1:
+            raise ValueError(f"Rule node must have exactly one operator: {node!r}")
+        (op, args), = node.items()
+        if not isinstance(args, list):
+            args = [args]
+        
+        if op == "var":
+            path = args[0] if args else ""
+            if path == "":
+                return "f"
+            default = self.expr(args[1]) if len(args) > 1 else "None"
+            if "." not in str(path):
+                return f"f.get({path!r}, {default})"
+            return f"_var(f, {path!r}, {default})"
+        if op == "if":
+            # [cond, then, cond, then, ..., else]
+            if len(args) % 2 == 0:
+                args = args + [None]
+            source = self.expr(args[-1])
+            for i in range(len(args) - 3, -1, -2):
+                source = f"({self.expr(args[i + 1])} if {self.expr(args[i])} else {source})"
+            return source
+        if op in ("and", "or"):
+            return "(" + f" {op} ".join(self.expr(a) for a in args) + ")"
+        if op == "!":
+            return f"(not {self.expr(args[0])})"
+        if op == "!!":
+            return f"bool({self.expr(args[0])})"
+        if op in ("==", "!="):
+            return f"({self.expr(args[0])} {op} {self.expr(args[1])})"
+        if op in _COMPARISONS:
+            return f"({self.operand(args[0])} {op} {self.operand(args[1])})"
+        if op == "in":
+            return f"({self.expr(args[0])} in ({self.expr(args[1])} or ()))"
+        raise ValueError(f"Unsupported rule operator: {op!r}")
+
+
+def compile_rule(rule: Any, name: str = "_decide") -> Callable[[Dict[str, Any]], Any]:
+    """
+    Compile a json-logic style rule into a function of the findings dict.
+    
+    The returned function also carries a .batch variant that evaluates the
+    rule over a list of findings inside a single comprehension - one call
+    for a whole batch instead of one per slide.
+    
+    Supported operators: var, if, and, or, !, !!, ==, !=, >, >=, <, <=, in
+    """
+    compiler = _Compiler()
+    body = compiler.expr(rule)
+    source = (
+        f"def {name}(f):\n    return {body}\n\n"
+        f"def {name}_batch(fs):\n    return [{body} for f in fs]\n"
+    )
+    
+    namespace: Dict[str, Any] = {"_var": _var, "_num": _num, **compiler.constants}
+    exec(compile(source, f"<rule {name}>", "exec"), namespace)
+    func = namespace[name]
+    func.batch = namespace[f"{name}_batch"]
+    func.__source__ = source
+    return func
+
+
+def load_rules(path: Path = RULES_PATH) -> Dict[str, Callable[[Dict[str, Any]], Any]]:
+    """Load the rule file and compile every rule in it, keyed by output field."""
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    return {field: compile_rule(rule, name=f"_decide_{field}") for field, rule in rules.items()}
@@ -0,0 +1,40 @@
+"""
+Slide Image Storage
+Where uploaded slide images live and which image types are accepted, shared
+by the API (serving uploads) and the billing agent (sending them to Gemini).
+"""
+
+import os
+from typing import Tuple
+
+UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.dirname(__file__)), "uploads"))
+
+# Slide image types by extension
+IMAGE_MIME_TYPES = {
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+}
+
+
+def resolve_slide_image(image_path: str) -> Tuple[str, str]:
+    """
+    Map a client-supplied image path to (real path, mime type).
+    
+    Relative paths and the "/uploads/<file>" URL form resolve inside
+    UPLOAD_DIR. Raises PermissionError - before anything is read - for a
+    path that resolves outside UPLOAD_DIR or isn't a known image type.
+    """
+    if image_path.startswith("/uploads/"):
+        image_path = image_path[len("/uploads/"):]
+    upload_dir = os.path.realpath(UPLOAD_DIR)
+    real_path = os.path.realpath(os.path.join(upload_dir, image_path))
+    if os.path.commonpath([upload_dir, real_path]) != upload_dir:
+        raise PermissionError(f"Slide image must be inside the uploads directory: {image_path}")
+    
+    mime_type = IMAGE_MIME_TYPES.get(os.path.splitext(real_path)[1].lower())
+    if mime_type is None:
+        raise PermissionError(f"Not a supported slide image type: {image_path}")
+    return real_path, mime_type
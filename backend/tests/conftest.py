@@ -0,0 +1,13 @@
+"""
+Shared test setup: point the app at a throwaway SQLite file before anything
+imports models (which creates the engine and tables at import time).
+"""
+
+import os
+import sys
+import tempfile
+
+_TMP_DIR = tempfile.mkdtemp(prefix="pathoai-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
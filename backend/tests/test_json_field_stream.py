@@ -0,0 +1,77 @@
+"""
+_JSONFieldStream hands out each top-level member of a streamed JSON object
+as soon as it is complete, however the text is split into chunks.
+"""
+
+import json
+
+import pytest
+
+from services.billing_agent import _JSONFieldStream
+
+RESPONSE = {
+    "base_cpt": "88305",
+    "recommended_cpt": "88309",
+    "revenue_delta": 18.4,
+    "cpt_codes": {"base": "88305", "ancillary": ["88342", "88341"]},
+    "audit_narrative": 'Tricky "quoted" text with {braces}, [brackets], commas and a \\ backslash.',
+    "complexity_indicators": ["High grade, 3/3", "PNI"],
+    "confidence_score": 0.94,
+    "flags": [],
+    "nested": {"a": {"b": [1, {"c": "}"}]}},
+    "none": None,
+}
+TEXT = json.dumps(RESPONSE, indent=2)
+
+
+def _stream(chunks):
+    parser = _JSONFieldStream()
+    members = [member for chunk in chunks for member in parser.feed(chunk)]
+    return members, parser.close()
+
+
+def test_whole_response_in_one_chunk():
+    members, final = _stream([TEXT])
+    assert members == list(RESPONSE.items())
+    assert final == RESPONSE
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 16, 64])
+def test_split_into_chunks(size):
+    members, final = _stream([TEXT[i:i + size] for i in range(0, len(TEXT), size)])
+    assert members == list(RESPONSE.items())
+    assert final == RESPONSE
+
+
+def test_split_at_every_position():
+    for i in range(1, len(TEXT)):
+        members, _ = _stream([TEXT[:i], TEXT[i:]])
+        assert members == list(RESPONSE.items()), i
+
+
+def test_member_is_emitted_once_complete():
+    parser = _JSONFieldStream()
+    assert parser.feed('{"a": 1, "b": {"c"') == [("a", 1)]
+    assert parser.feed(': 2}') == []
+    assert parser.feed(', "d": "x,y"') == [("b", {"c": 2})]
+    assert parser.feed("}") == [("d", "x,y")]
+
+
+def test_close_parses_the_full_buffer():
+    parser = _JSONFieldStream()
+    parser.feed('{"a": [1, 2')
+    parser.feed('], "b": true}')
+    assert parser.close() == {"a": [1, 2], "b": True}
+
+
+def test_close_rejects_truncated_response():
+    parser = _JSONFieldStream()
+    assert parser.feed('{"a": 1, "b": "unterminated') == [("a", 1)]
+    with pytest.raises(json.JSONDecodeError):
+        parser.close()
+
+
+def test_empty_object():
+    members, final = _stream(["{", " ", "}"])
+    assert members == []
+    assert final == {}
@@ -0,0 +1,37 @@
+"""
+LLM response cache: a semantic hit must never cross a different CPT rule
+verdict, since the verdict is part of the prompt.
+"""
+
+from services.billing_agent import BillingAgent
+from services.llm_cache import LLMCache
+
+
+def test_semantic_match_stays_within_scope():
+    cache = LLMCache()
+    cache.put("k1", {"recommended_cpt": "88309"}, [1.0, 0.0], scope="88309")
+    
+    assert cache.get_similar([1.0, 0.01], scope="") is None
+    assert cache.get_similar([1.0, 0.01], scope="88307") is None
+    assert cache.get_similar([1.0, 0.01], scope="88309") == {"recommended_cpt": "88309"}
+
+
+def test_persisted_scope_survives_reload(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    cache = LLMCache(persist_path=path, version="v1")
+    cache.put("k1", {"n": 1}, [0.0, 1.0], scope="88309")
+    cache.close()
+    
+    reloaded = LLMCache(persist_path=path, version="v1")
+    assert reloaded.get_similar([0.0, 1.0]) is None
+    assert reloaded.get_similar([0.0, 1.0], scope="88309") == {"n": 1}
+    reloaded.close()
+
+
+def test_exact_key_includes_rule_verdict():
+    findings = {"mitoses_per_10hpf": 3}
+    assert BillingAgent._cache_key("S-1", findings, None, None) != BillingAgent._cache_key("S-1", findings, None, "88309")
+
+
+def test_semantic_cache_is_opt_in():
+    assert BillingAgent().semantic_cache is False
@@ -0,0 +1,135 @@
+"""
+LocalDB: append-only log replay, the single writer thread, and flushing
+queued writes on close().
+"""
+
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def local_db(tmp_path, monkeypatch):
+    # Importing the module builds its default singleton relative to the cwd
+    monkeypatch.chdir(tmp_path)
+    from services.local_db import LocalDB
+    
+    opened = []
+    
+    def open_db(**kwargs):
+        db = LocalDB(str(tmp_path / "cases.jsonl"), **kwargs)
+        opened.append(db)
+        return db
+    
+    yield open_db
+    for db in opened:
+        db.close()
+
+
+def test_append_and_replay(local_db, tmp_path):
+    db = local_db()
+    first = db.add_case({"slide_id": "S-1", "status": "pending", "revenue_delta": 10})
+    db.add_case({"slide_id": "S-2", "status": "verified", "revenue_delta": 5})
+    db.update_case("S-1", {"status": "verified", "slide_id": "S-1b"})
+    db.close()
+    
+    # One line per write; the latest line for an id wins on replay
+    lines = (tmp_path / "cases.jsonl").read_bytes().splitlines()
+    assert len(lines) == 3
+    
+    reopened = local_db()
+    assert [c["slide_id"] for c in reopened.get_all_cases()] == ["S-1b", "S-2"]
+    assert reopened.get_case(first["id"])["status"] == "verified"
+    assert reopened.get_case("S-1b")["id"] == first["id"]
+    assert reopened.get_case("S-1") is None
+    assert reopened.get_revenue_summary()["total_recovered"] == 15
+
+
+def test_torn_trailing_write_is_skipped(local_db, tmp_path):
+    db = local_db()
+    db.add_case({"slide_id": "S-1"})
+    db.close()
+    with open(tmp_path / "cases.jsonl", "ab") as f:
+        f.write(b'{"id": "DOC-000002", "slide')
+    
+    assert [c["slide_id"] for c in local_db().get_all_cases()] == ["S-1"]
+
+
+def test_close_flushes_queued_writes(local_db):
+    db = local_db()
+    # Queue without waiting on the futures - close() must drain them first
+    futures = [db._submit("add", {"slide_id": f"S-{i}"}) for i in range(500)]
+    futures.append(db._submit("update", "S-0", {"status": "verified"}))
+    db.close()
+    
+    assert all(f.done() for f in futures)
+    reopened = local_db()
+    assert len(reopened.get_all_cases()) == 500
+    assert reopened.get_case("S-0")["status"] == "verified"
+
+
+def test_concurrent_writers_keep_unique_ids(local_db):
+    db = local_db()
+    
+    def write(n):
+        for i in range(50):
+            db.add_case({"slide_id": f"T{n}-{i}"})
+    
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    db.close()
+    
+    cases = local_db().get_all_cases()
+    assert len(cases) == 400
+    assert len({c["id"] for c in cases}) == 400
+
+
+def test_compaction_keeps_latest_versions(local_db, tmp_path):
+    db = local_db()
+    db.COMPACT_MIN_LINES = 10
+    db.add_case({"slide_id": "S-1", "n": 0})
+    for n in range(1, 30):
+        db.update_case("S-1", {"n": n})
+    db.close()
+    
+    assert len((tmp_path / "cases.jsonl").read_bytes().splitlines()) <= 10
+    assert local_db().get_case("S-1")["n"] == 29
+
+
+@pytest.mark.parametrize("method", ["add", "update"])
+def test_async_api_awaits_the_writer(local_db, method):
+    import asyncio
+    
+    db = local_db()
+    db.add_case({"slide_id": "S-1"})
+    
+    async def run():
+        if method == "add":
+            return await db.add_case_async({"slide_id": "S-2"})
+        return await db.update_case_async("S-1", {"status": "verified"})
+    
+    record = asyncio.run(run())
+    assert db.get_case(record["id"]) == record
+
+
+def test_returned_cases_are_copies(local_db, tmp_path):
+    db = local_db()
+    added = db.add_case({"slide_id": "S-1", "status": "pending"})
+    added["status"] = "tampered"
+    db.get_case("S-1")["status"] = "tampered"
+    db.get_all_cases()[0]["slide_id"] = "S-x"
+    db.get_cases_by_status("pending")[0]["status"] = "tampered"
+    updated = db.update_case("S-1", {"revenue_delta": 3})
+    updated["revenue_delta"] = 99
+    
+    assert db.get_case("S-1")["status"] == "pending"
+    assert db.get_case("S-1")["revenue_delta"] == 3
+    assert db.get_case("S-x") is None
+    db.close()
+    
+    # Nothing mutated outside the writer reached the log either
+    reopened = local_db()
+    assert reopened.get_case("S-1")["status"] == "pending"
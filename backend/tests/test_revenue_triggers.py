@@ -0,0 +1,76 @@
+"""
+Trigger-maintained revenue aggregates (SQLite) must always agree with a
+full scan of the cases table.
+"""
+
+import pytest
+
+from models import SessionLocal, PathologyCase, CaseRevenueTotals, engine, _install_revenue_triggers
+from services.db_service import RevenueService
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    session.query(PathologyCase).delete()
+    session.commit()
+    yield session
+    session.query(PathologyCase).delete()
+    session.commit()
+    session.close()
+
+
+def _assert_totals_match(db):
+    db.expire_all()
+    materialized = RevenueService._materialized_totals(db)
+    scanned = RevenueService._scanned_totals(db)
+    
+    assert materialized[0] == scanned[0]
+    assert materialized[1] == pytest.approx(scanned[1])
+    assert materialized[2] == pytest.approx(scanned[2])
+    assert materialized[3] == scanned[3]
+    assert sorted(materialized[4]) == sorted(scanned[4])
+
+
+def _case(n, **fields):
+    return PathologyCase(patient_id=f"PT-T{n}", slide_id=f"S-T{n}", **fields)
+
+
+def test_null_status_row_does_not_null_the_totals(db):
+    db.add(_case(1, status="VERIFIED", recovery_value=20.0, audit_defense_score=95,
+                 base_cpt_code="88305", suggested_cpt_code="88309"))
+    db.add(_case(2, status=None, recovery_value=10.0, audit_defense_score=80))
+    db.commit()
+    _assert_totals_match(db)
+    
+    totals = db.get(CaseRevenueTotals, 1)
+    assert totals.total_cases == 1
+    assert totals.total_recovered == pytest.approx(20.0)
+    
+    # Into and out of a NULL status, then delete while NULL
+    case = db.query(PathologyCase).filter_by(slide_id="S-T1").one()
+    case.status = None
+    db.commit()
+    _assert_totals_match(db)
+    
+    case.status = "EXPORTED"
+    db.commit()
+    _assert_totals_match(db)
+    
+    db.delete(db.query(PathologyCase).filter_by(slide_id="S-T2").one())
+    db.commit()
+    _assert_totals_match(db)
+    assert db.get(CaseRevenueTotals, 1).total_cases == 1
+
+
+def test_install_repairs_nulled_totals(db):
+    db.add(_case(3, status="ANALYZED", recovery_value=5.0, audit_defense_score=91))
+    db.commit()
+    
+    # As left behind by the old triggers after a NULL-status write
+    with engine.begin() as conn:
+        conn.exec_driver_sql("UPDATE case_revenue_totals SET total_cases = NULL, total_recovered = NULL WHERE id = 1")
+    
+    _install_revenue_triggers()
+    _assert_totals_match(db)
+    assert db.get(CaseRevenueTotals, 1).total_cases == 1
@@ -0,0 +1,72 @@
+"""
+Compiled CPT rules (cpt_rules.json) must give the same verdicts as the
+rules read literally, for single findings and for batches.
+"""
+
+import pytest
+
+from services.rule_engine import compile_rule, load_rules
+
+decide = load_rules()["recommended_cpt"]
+
+CASES = [
+    ({"mitoses_per_10hpf": 18}, "88309"),
+    ({"mitoses_per_10hpf": 15}, None),
+    ({"mitoses_per_10hpf": 15.5}, "88309"),
+    ({"perineural_invasion": True}, "88309"),
+    ({"lymphovascular_invasion": True, "specimen_count": 3}, "88309"),
+    ({"margin_assessment": True}, "88307"),
+    ({"ihc_required": True, "mitoses_per_10hpf": 3}, "88307"),
+    ({"specimen_count": 2}, "88307"),
+    ({"specimen_count": 1}, None),
+    ({"perineural_invasion": False, "margin_assessment": False}, None),
+    ({}, None),
+    # Non-numeric values never satisfy an ordering test
+    ({"mitoses_per_10hpf": "18"}, None),
+    ({"specimen_count": None}, None),
+    ({"mitoses_per_10hpf": True}, None),
+]
+
+
+@pytest.mark.parametrize("findings, expected", CASES)
+def test_cpt_rules(findings, expected):
+    assert decide(findings) == expected
+
+
+def test_batch_matches_single():
+    findings = [f for f, _ in CASES]
+    assert decide.batch(findings) == [expected for _, expected in CASES]
+    assert decide.batch([]) == []
+
+
+def test_dotted_var_and_default():
+    rule = {"if": [{">=": [{"var": ["tumor.grade", 0]}, 3]}, "high", "low"]}
+    f = compile_rule(rule)
+    assert f({"tumor": {"grade": 3}}) == "high"
+    assert f({"tumor": {"grade": 2}}) == "low"
+    assert f({"tumor": "n/a"}) == "low"
+    assert f({}) == "low"
+
+
+def test_in_and_negation():
+    f = compile_rule({"and": [{"in": [{"var": "stain"}, ["ER", "PR"]]}, {"!": {"var": "benign"}}]})
+    assert f({"stain": "ER"}) is True
+    assert f({"stain": "HER2"}) is False
+    assert f({"stain": "PR", "benign": True}) is False
+
+
+def test_if_without_else_defaults_to_none():
+    assert compile_rule({"if": [{"var": "x"}, "yes"]})({}) is None
+
+
+def test_literals_are_not_executed_as_code():
+    payload = "__import__('os').system('false')"
+    f = compile_rule({"if": [{"==": [{"var": "x"}, payload]}, payload, None]})
+    assert f({"x": payload}) == payload
+    assert f({"x": 1}) is None
+
+
+@pytest.mark.parametrize("rule", [{"eval": ["1"]}, {">": [1, 2], "<": [1, 2]}])
+def test_invalid_rules_raise(rule):
+    with pytest.raises(ValueError):
+        compile_rule(rule)
@@ -0,0 +1,44 @@
+"""
+Slide image paths come from the client, so only image files inside the
+uploads directory may be read and sent to Gemini.
+"""
+
+import os
+
+import pytest
+
+from services.billing_agent import _read_slide_image
+from services.slide_images import UPLOAD_DIR, resolve_slide_image
+
+
+@pytest.fixture
+def slide_png():
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(UPLOAD_DIR, "TEST-SLIDE.png")
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG test")
+    yield path
+    os.remove(path)
+
+
+@pytest.mark.parametrize("form", ["TEST-SLIDE.png", "/uploads/TEST-SLIDE.png", "abs"])
+def test_reads_images_inside_uploads(slide_png, form):
+    image = _read_slide_image(slide_png if form == "abs" else form)
+    assert image == {"mime_type": "image/png", "data": b"\x89PNG test"}
+
+
+@pytest.mark.parametrize("path", [
+    "/etc/hostname",
+    "../requirements.txt",
+    "/uploads/../main.py",
+    os.path.join(UPLOAD_DIR, "..", "models.py"),
+])
+def test_rejects_paths_outside_uploads(path):
+    with pytest.raises(PermissionError):
+        resolve_slide_image(path)
+
+
+@pytest.mark.parametrize("name", ["notes.txt", "slide", "slide.svg"])
+def test_rejects_non_image_types(name):
+    with pytest.raises(PermissionError):
+        resolve_slide_image(name)